@@ -0,0 +1,212 @@
+# Functions to persist Stat-Xplore table data locally as memory-mapped arrays
+import json
+import hashlib
+import numpy as np
+import os
+
+cube_store_dir = 'cube_store'
+values_filename = 'values.npy'
+coords_filename = 'coords.json'
+
+
+def get_cube_key(request_args):
+    '''Get the key used to store the data returned for a data request. Requests made with the same
+    arguments are stored under the same key, so the key can be found without building the request body.
+
+    Args:
+        request_args (dict): The arguments the data was requested with, eg the measure id, field ids and geography labels.
+
+    Returns:
+        str: The cube key
+    '''
+    args_text = json.dumps(request_args, sort_keys = True)
+    return hashlib.sha1(args_text.encode('utf-8')).hexdigest()
+
+def cube_exists(cube_key, store_dir = cube_store_dir):
+    '''Check whether a cube has been saved to the store. A cube is only considered to exist once both
+    the values and coordinates files are present.
+
+    Args:
+        cube_key (str): The key of the cube
+
+    Kwargs:
+        store_dir (str): Default 'cube_store'. The directory of the cube store.
+    '''
+    cube_dir = os.path.join(store_dir, cube_key)
+    return os.path.exists(os.path.join(cube_dir, values_filename)) & os.path.exists(os.path.join(cube_dir, coords_filename))
+
+def save_cube(cube_key, field_items, field_headers, cubes_array, annotations = None, body = None, store_dir = cube_store_dir):
+    '''Save the data values of a table response to the cube store. Values are saved as an N-d array
+    that can be memory-mapped when loaded. The field and field item uris and labels are saved alongside.
+    Any cube already saved under the key is overwritten.
+
+    Each file is written to a temporary file and then moved into place. The coordinates file of an existing
+    cube is removed first and the new one moved into place last, so an interrupted save does not leave a
+    partially written cube that appears to exist.
+
+    Args:
+        cube_key (str): The key to save the cube under
+        field_items (dict): The 'labels' and 'uris' of the items of each field, as returned by stat_xplore_table.unpack_response_fields
+        field_headers (dict): The 'labels' and 'uris' of each field, as returned by stat_xplore_table.unpack_response_fields
+        cubes_array (multi-dim numpy array): The data values, with a dimension for each field
+
+    Kwargs:
+        annotations (dict, None): Default None. The database annotations accompanying the data.
+        body (dict, None): Default None. The request body the data was returned for.
+        store_dir (str): Default 'cube_store'. The directory of the cube store.
+
+    Returns:
+        str: The directory the cube was saved to
+    '''
+    cubes_array = np.array(cubes_array)
+    assert cubes_array.ndim == len(field_headers['uris'])
+
+    cube_dir = os.path.join(store_dir, cube_key)
+    if os.path.exists(cube_dir) == False:
+        os.makedirs(cube_dir)
+
+    values_path = os.path.join(cube_dir, values_filename)
+    coords_path = os.path.join(cube_dir, coords_filename)
+
+    if os.path.exists(coords_path):
+        os.remove(coords_path)
+
+    with open(values_path + '.tmp', 'wb') as f:
+        np.save(f, cubes_array)
+    os.replace(values_path + '.tmp', values_path)
+
+    coords = {  'field_items':field_items,
+                'field_headers':field_headers,
+                'shape':list(cubes_array.shape),
+                'annotations':annotations,
+                'body':body}
+    with open(coords_path + '.tmp', 'w', encoding = 'utf-8') as f:
+        json.dump(coords, f)
+    os.replace(coords_path + '.tmp', coords_path)
+
+    return cube_dir
+
+def load_cube(cube_key, store_dir = cube_store_dir):
+    '''Load a cube from the cube store. The data values are memory-mapped rather than read into memory,
+    so only the parts of the cube that are sliced are read from disk.
+
+    Args:
+        cube_key (str): The key of the cube to load
+
+    Kwargs:
+        store_dir (str): Default 'cube_store'. The directory of the cube store.
+
+    Returns:
+        dict: Keys: 'values' - read only memory-mapped array of data values, 'field_items', 'field_headers',
+            'annotations', 'body' and 'indexes' - a dictionary with 'uris' and 'labels' keys, each a list with a dictionary 
+            for each field mapping item uri or label to position. Labels shared by more than one item in a field map to None.
+            None if the cube does not exist or could not be loaded.
+    '''
+    if cube_exists(cube_key, store_dir) == False:
+        return None
+
+    cube_dir = os.path.join(store_dir, cube_key)
+    try:
+        with open(os.path.join(cube_dir, coords_filename), 'r', encoding = 'utf-8') as f:
+            cube = json.load(f)
+
+        cube['values'] = np.load(os.path.join(cube_dir, values_filename), mmap_mode = 'r')
+        assert list(cube['values'].shape) == cube['shape']
+    except Exception as err:
+        print(err)
+        print('Unable to load cube {} from the cube store.'.format(cube_key))
+        return None
+
+    # Form lookups from field item uri and label to position along each dimension.
+    # Values shared by more than one item can't identify a position so are mapped to None
+    cube['indexes'] = {}
+    for by in ['uris', 'labels']:
+        cube['indexes'][by] = []
+        for values in cube['field_items'][by]:
+            index = {}
+            for i, value in enumerate(values):
+                index[value] = None if value in index else i
+            cube['indexes'][by].append(index)
+
+    return cube
+
+def get_cube_dimension(cube, field, by = 'uri'):
+    '''Get the dimension of the cube values array that a field is indexed along.
+
+    Args:
+        cube (dict): The cube, as returned by load_cube
+        field (str): The uri or label of the field
+
+    Kwargs:
+        by (str): Default 'uri'. Either 'uri' or 'label'. Sets whether field is a field uri or label.
+
+    Returns:
+        int: The dimension of the field
+    '''
+    if by not in ['uri', 'label']:
+        raise ValueError("Unrecognised value of by: {}. Must be either 'uri' or 'label'".format(by))
+
+    fields = cube['field_headers'][by + 's']
+    if field not in fields:
+        raise KeyError("Field {} {} not found in cube. Cube fields are: {}".format(by, field, fields))
+
+    return fields.index(field)
+
+def get_cube_position(cube, dimension, item, by = 'uri'):
+    '''Get the position of a field item along the dimension of that field.
+
+    Args:
+        cube (dict): The cube, as returned by load_cube
+        dimension (int): The dimension of the field
+        item (str): The uri or label of the field item
+
+    Kwargs:
+        by (str): Default 'uri'. Either 'uri' or 'label'. Sets whether item is a field item uri or label.
+
+    Returns:
+        int: The position of the field item
+    '''
+    if by not in ['uri', 'label']:
+        raise ValueError("Unrecognised value of by: {}. Must be either 'uri' or 'label'".format(by))
+
+    index = cube['indexes'][by + 's'][dimension]
+    if item not in index:
+        raise KeyError("Item {} {} not found in cube field {}".format(by, item, cube['field_headers']['uris'][dimension]))
+    if index[item] is None:
+        raise KeyError("Item {} {} is shared by more than one item in cube field {}".format(by, item, cube['field_headers']['uris'][dimension]))
+
+    return index[item]
+
+def get_cube_slice(cube, selection, by = 'uri'):
+    '''Slice the values of a cube by field items, for example by geography code or date period. Only
+    the selected values are read from the memory-mapped values array.
+
+    Args:
+        cube (dict): The cube, as returned by load_cube
+        selection (dict): Field uris or labels as keys. Values are the field item uri or label, or a list of
+            field item uris or labels, to select. Fields not included in the selection are returned in full.
+
+    Kwargs:
+        by (str): Default 'uri'. Either 'uri' or 'label'. Sets whether the fields and items in selection are uris or labels.
+
+    Returns:
+        numpy array: The selected values. Dimensions selected by a single item are dropped.
+    '''
+    slicer = [slice(None)] * cube['values'].ndim
+    list_selections = {}
+    for field, items in selection.items():
+        dimension = get_cube_dimension(cube, field, by = by)
+        if isinstance(items, str):
+            slicer[dimension] = get_cube_position(cube, dimension, items, by = by)
+        else:
+            list_selections[dimension] = [get_cube_position(cube, dimension, item, by = by) for item in items]
+
+    # Single item selections are basic indexing of the memory-mapped array so don't read any values
+    values = cube['values'][tuple(slicer)]
+
+    # Take the list selections along each remaining axis, accounting for the dimensions dropped above
+    for dimension, positions in list_selections.items():
+        axis = dimension - len([i for i in slicer[:dimension] if isinstance(i, int)])
+        values = np.take(values, positions, axis = axis)
+
+    return np.asarray(values)
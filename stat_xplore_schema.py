@@ -2,13 +2,20 @@ import requests
 import pandas as pd 
 import os
 import re
+import sys
 
 schema_url = 'https://stat-xplore.dwp.gov.uk/webapi/rest/v1/schema'
 
+# The schema information recorded for each schema element. Records are held as tuples in this order
+schema_columns = ['id', 'type', 'label', 'location', 'parent_id']
+
 def get_full_schema(schema_headers, types_to_include = ["FOLDER","DATABASE","MEASURE","FIELD"], check_cache = False, schema_filename = 'schema.csv'):
     '''Get the schema information of all elements of the Stat-Xplore schema but sratting at the root 
     folder and iterating through the schema tree.
 
+    Schema records are collected into a single list as the tree is crawled and the schema dataframe is 
+    built once at the end, rather than concatenating dataframes on each tier.
+
     Args:
         schema_headers (dict): The headers to use in the html request to the stat-xplore API.
 
@@ -25,23 +32,29 @@ def get_full_schema(schema_headers, types_to_include = ["FOLDER","DATABASE","MEA
         return
     root_json = root_reponse['response'].json()
 
-    # Remove the 'children' key of the schema - we only want to record the 'id', 'type', 'label' and 'location' schema information
-    del root_json['children']
+    # Load the cached schema once, rather than once per schema item
+    schema_cache = load_schema_cache(schema_filename) if check_cache == True else None
 
-    # Initialise full schema dataframe with the schema infomation of the root folder
-    df_full_schema = pd.DataFrame([root_json])
+    # Initialise the schema records with the schema infomation of the root folder.
+    # We only want to record the 'id', 'type', 'label' and 'location' schema information
+    schema_records = [schema_json_to_record(root_json)]
 
     # Start loop to interate over all parent schema items
-    still_to_map = df_full_schema
+    still_to_map = schema_records
+    type_index = schema_columns.index('type')
+    location_index = schema_columns.index('location')
     while len(still_to_map) >0:
 
-        new_schema = get_lower_tier_schema_from_upper_tier_schema(still_to_map, schema_headers, check_cache, cache_filename = schema_filename)
+        parent_locations = list(dict.fromkeys(record[location_index] for record in still_to_map))
+        new_records = get_lower_tier_schema_records(parent_locations, schema_headers, schema_cache)
 
         # Only get children schemas desired types in the resulting schema. 
         # Eg exclude value sets such as all geographies (this can take a while to get)
-        still_to_map = new_schema.loc[new_schema['type'].isin(types_to_include)]
+        still_to_map = [record for record in new_records if record[type_index] in types_to_include]
 
-        df_full_schema = pd.concat([df_full_schema, new_schema], join = 'outer')
+        schema_records += new_records
+
+    df_full_schema = schema_records_to_dataframe(schema_records)
 
     # Save the schema at the end
     df_full_schema.to_csv(schema_filename, index=False, encoding = 'utf-8')
@@ -66,20 +79,40 @@ def get_lower_tier_schema_from_upper_tier_schema(df_parent_schema, schema_header
     # Get teh urls of each of the parent items
     parent_locations = df_parent_schema['location'].unique()
 
-    # initialise the lower tier schema
-    df_lower_tier_schema = pd.DataFrame()
+    schema_cache = load_schema_cache(cache_filename) if check_cache == True else None
+
+    schema_records = get_lower_tier_schema_records(parent_locations, schema_headers, schema_cache)
+
+    return schema_records_to_dataframe(schema_records)
+
+def get_lower_tier_schema_records(parent_locations, schema_headers, schema_cache = None):
+    '''Loop through the parent schema item locations and collect the schema records of the children of each one 
+    into a single list.
+
+    Args:
+        parent_locations (list of str): The urls of the parent schema items
+        schema_headers (dict): The headers to use in the html request to the stat-xplore API.
+
+    Kwargs:
+        schema_cache (dict, None): Default None. The cached schema, as returned by load_schema_cache. 
+            If None the API is requested for all schema items.
+
+    Returns:
+        list of tuple: The schema records of the children items
+    '''
+    # initialise the lower tier schema records
+    lower_tier_records = []
 
     # Iterate over parent items and get children schema
     for location in parent_locations:
-        children_schema_result = get_children_schema_of_url(location, schema_headers, check_cache, cache_filename)
+        children_schema_result = get_children_schema_records_of_url(location, schema_headers, schema_cache)
         if children_schema_result['success'] == False:
             print('Faield to get children schema for location {}'.format(location))
             continue
 
-        df_lower_tier_schema = pd.concat([df_lower_tier_schema, children_schema_result['schema']], join = 'outer')
+        lower_tier_records += children_schema_result['records']
 
-
-    return df_lower_tier_schema
+    return lower_tier_records
 
 def get_children_schema_of_url(url, schema_headers, check_cache = False, cache_filename = 'schema.csv'):
     '''Given a url of a Stat-xplore schema item, get the schema details of the children (component) items. 
@@ -96,43 +129,124 @@ def get_children_schema_of_url(url, schema_headers, check_cache = False, cache_f
                                 to check for.
     '''
 
-    output = {'success':False, 'schema':None, 'from_cache':False}
+    schema_cache = load_schema_cache(cache_filename) if check_cache == True else None
 
-    # Check for saved schema
-    if (check_cache == True) & (os.path.exists(cache_filename) == True):
+    result = get_children_schema_records_of_url(url, schema_headers, schema_cache)
+    if result['success'] == False:
+        return {'success':False, 'schema':None, 'from_cache':False}
 
-        try:
-            df_full_schema = pd.read_csv(cache_filename, encoding = 'utf-8')
-            parent_id = df_full_schema.loc[ df_full_schema['location'] == url, 'id'].values[0]
-            df_schema = df_full_schema.loc[df_full_schema['parent_id'] == parent_id]
-            assert len(df_schema) != 0
+    return {'success':True,'schema':schema_records_to_dataframe(result['records']), 'from_cache':result['from_cache']}
 
-            return {'success':True,'schema':df_schema, 'from_cache':True}
-        except Exception as err:
-            print(err)
-            print('Unable to load cached schema. Requesting from API instead.')
-            df_schema = pd.DataFrame()
-    else:
-        df_schema = pd.DataFrame()
+def get_children_schema_records_of_url(url, schema_headers, schema_cache = None):
+    '''Given a url of a Stat-xplore schema item, get the schema records of the children (component) items. 
+    Each record is a tuple of the id, type, label, location(url) and parent id of the child item.
 
+    Args:
+        url (str): The url of the schema item to get the children schema details of.
+        schema_headers (dict): The headers to use in the html request to the stat-xplore API.
+
+    Kwargs:
+        schema_cache (dict, None): Default None. The cached schema, as returned by load_schema_cache. 
+            If None, or the children are not found in the cache, the API is requested.
 
-    # If the schema dataframe is empty (which it will be if the cache wasn't successfully checked)
+    Returns:
+        dict: Keys: 'success', 'records' - list of tuple schema records, 'from_cache' - whether records came from the cache.
+    '''
+
+    output = {'success':False, 'records':None, 'from_cache':False}
+
+    # Check for saved schema. Items without cached children are requested from the API
+    if schema_cache is not None:
+        parent_id = schema_cache['location_ids'].get(url)
+        if (parent_id is not None) & (parent_id in schema_cache['children']):
+            return {'success':True,'records':schema_cache['children'][parent_id], 'from_cache':True}
+
+    # If this far the children weren't found in the cache,
     # make request to the API to get the schema details
-    if len(df_schema) == 0:
+    schema_response = request_schema(schema_headers, url = url)
+    if schema_response['success'] == False:
+        return output
+
+    # If this far, request to API was successfull and we should have schema information
+    # Create schema records of children elements
+    schema_response_json = schema_response['response'].json()
 
-        schema_response = request_schema(schema_headers, url = url)
-        if schema_response['success'] == False:
-            return output
+    # Will there always be a children element?
+    parent_id = schema_response_json['id']
+    records = [schema_json_to_record(child, parent_id) for child in schema_response_json['children']]
 
-        # If this far, request to API was successfull and we should have schema information
-        # Create dataframe with schema info of children elements
-        schema_response_json = schema_response['response'].json()
+    return {'success':True,'records':records, 'from_cache':False}
 
-        # Will there always be a children element?
-        df_schema = pd.DataFrame(schema_response_json['children'])
-        df_schema['parent_id'] = schema_response_json['id']
+def load_schema_cache(cache_filename = 'schema.csv'):
+    '''Load the cached schema csv and index it by schema item location and by parent id so that the 
+    children of a schema item can be looked up without scanning the whole schema.
 
-    return {'success':True,'schema':df_schema, 'from_cache':False}
+    Kwargs:
+        cache_filename (str): Default 'schema.csv'. The filename of the cached schema.
+
+    Returns:
+        dict, None: Keys: 'location_ids' - dict of location to id, 'children' - dict of parent id to list of schema records.
+            None if the cache could not be loaded.
+    '''
+    if os.path.exists(cache_filename) == False:
+        return None
+
+    try:
+        df_cached_schema = pd.read_csv(cache_filename, encoding = 'utf-8')
+        df_cached_schema = df_cached_schema.reindex(columns = schema_columns)
+        df_cached_schema = df_cached_schema.astype(object).where(df_cached_schema.notnull(), None)
+    except Exception as err:
+        print(err)
+        print('Unable to load cached schema. Requesting from API instead.')
+        return None
+
+    location_ids = {}
+    children = {}
+    id_index = schema_columns.index('id')
+    location_index = schema_columns.index('location')
+    parent_id_index = schema_columns.index('parent_id')
+    for record in df_cached_schema.itertuples(index = False, name = None):
+        record = intern_schema_record(record)
+        location_ids[record[location_index]] = record[id_index]
+        children.setdefault(record[parent_id_index], []).append(record)
+
+    return {'location_ids':location_ids, 'children':children}
+
+def schema_json_to_record(schema_json, parent_id = None):
+    '''Convert the json of a single schema item into a schema record tuple. Only the 'id', 'type', 'label' 
+    and 'location' schema information is recorded, along with the id of the parent item.
+
+    Args:
+        schema_json (dict): The schema information of the schema item
+
+    Kwargs:
+        parent_id (str, None): Default None. The id of the parent schema item.
+
+    Returns:
+        tuple: The schema record, with values in the order of schema_columns
+    '''
+    record = (schema_json.get('id'), schema_json.get('type'), schema_json.get('label'), schema_json.get('location'), parent_id)
+    return intern_schema_record(record)
+
+def intern_schema_record(record):
+    '''Intern the string values of a schema record so that repeated values, such as parent ids and types, 
+    share a single string object.
+    '''
+    return tuple(sys.intern(value) if isinstance(value, str) else value for value in record)
+
+def schema_records_to_dataframe(schema_records):
+    '''Build the schema dataframe from a list of schema records. The low cardinality 'type' and 'parent_id' 
+    columns are stored as categoricals to reduce the memory footprint of the schema. The other columns hold 
+    the interned strings of the records.
+
+    Args:
+        schema_records (list of tuple): The schema records, with values in the order of schema_columns
+
+    Returns:
+        pandas DataFrame: The schema with columns 'id', 'type', 'label', 'location' and 'parent_id'
+    '''
+    df_schema = pd.DataFrame.from_records(schema_records, columns = schema_columns)
+    return df_schema.astype({'type':'category', 'parent_id':'category'})
 
 def request_schema(schema_headers, url = schema_url):
     '''Send request for schema to API. Check request was successful.
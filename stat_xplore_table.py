@@ -5,6 +5,7 @@ import numpy as np
 import requests
 import os
 import stat_xplore_schema
+import stat_xplore_cube_store
 
 table_url = 'https://stat-xplore.dwp.gov.uk/webapi/rest/v1/table'
 
@@ -21,7 +22,24 @@ def json_response_to_dataframe(dict_response):
         pandas DataFrame: The Stat-Xplore API data formatted as a DataFrame.
     '''
 
-    # Unpack field labels and uris (IDs) plus the labels and uris (IDs) of items within each field.
+    field_items, field_headers = unpack_response_fields(dict_response)
+
+    measure_uri = dict_response['measures'][0]['uri'] 
+    cubes_array = np.array(dict_response['cubes'][ measure_uri]['values'])
+
+    return cube_array_to_dataframe(field_items, field_headers, cubes_array)
+
+def unpack_response_fields(dict_response):
+    '''Unpack field labels and uris (IDs) plus the labels and uris (IDs) of items within each field from
+    the data returned by the Stat-Xplore API table end point.
+
+    Args:
+        dict_response (dict): Dictionary of data returned by the Stat-Xpore API table end point
+
+    Returns:
+        tuple: (field_items, field_headers). Both are dictionaries with 'labels' and 'uris' keys. field_items
+            contains a list of item values for each field, field_headers contains the label or uri of each field.
+    '''
     field_items = { 'labels':[],
                     'uris':[]}
     field_headers = {   'labels':[],
@@ -35,8 +53,20 @@ def json_response_to_dataframe(dict_response):
         field_items['uris'].append(unpack_field_items(field['items'], item_values_to_return = 'uris'))
         field_headers['uris'].append(field['uri'])
 
-    measure_uri = dict_response['measures'][0]['uri'] 
-    cubes_array = np.array(dict_response['cubes'][ measure_uri]['values'])
+    return field_items, field_headers
+
+def cube_array_to_dataframe(field_items, field_headers, cubes_array):
+    '''Unpack an array of data values into a 'long' format dataframe with a column for each field (uri and label)
+    and a column for the data value.
+
+    Args:
+        field_items (dict): The 'labels' and 'uris' of the items of each field, as returned by unpack_response_fields
+        field_headers (dict): The 'labels' and 'uris' of each field, as returned by unpack_response_fields
+        cubes_array (multi-dim numpy array): The data values to unpack
+
+    Returns:
+        pandas DataFrame: The data formatted as a DataFrame.
+    '''
 
     # unpack the data, using the field item values' IDs to index values
     dict_data = unpack_cube_data(field_items['uris'],field_headers['uris'], cubes_array)
@@ -138,7 +168,7 @@ def unpack_field_items(field_items, item_values_to_return = 'labels'):
     return item_values
 
 
-def get_stat_xplore_measure_data(table_headers, schema_headers, measure_id, field_ids = None, fields_include_total = None, df_schema = None, geog_folder_label = 'Geography (residence-based)', geog_field_label= 'National - Regional - LA - OAs', geog_level_label = 'Local Authority'):
+def get_stat_xplore_measure_data(table_headers, schema_headers, measure_id, field_ids = None, fields_include_total = None, df_schema = None, geog_folder_label = 'Geography (residence-based)', geog_field_label= 'National - Regional - LA - OAs', geog_level_label = 'Local Authority', cube_store_dir = None, refresh_cube_store = False, return_dataframe = True):
     '''For an input measure ID and field IDs as well as the labels for the geography folder, field and level to get data for 
     build that dictionary of data to send to the Stat-Xplore table end point to request data.
 
@@ -156,13 +186,46 @@ def get_stat_xplore_measure_data(table_headers, schema_headers, measure_id, fiel
         geog_folder_label (str): Defaults to 'Geography (residence-based)'. The label of the geography folder to get geography recodes from
         geog_field_label (str): Defaults tp 'National - Regional - LA - OAs'. The label of the geography field to get geography recodes from.
         geog_level_label (str): Defaults to 'Local Authority'. The label of the level (ie LAs, LSOAs etc) to get recodes for
+        cube_store_dir (str, None): Default None. The directory of a local cube store. If given, data previously saved to the store
+            for the same request arguments is loaded from the store without any requests to the API, and newly requested data is saved to the store.
+            Stored cubes never expire, so data published to Stat-Xplore after a cube was saved, such as new date periods, is not returned
+            unless refresh_cube_store is set.
+        refresh_cube_store (bool): Default False. Set whether to skip checking the cube store, request the data from the API and overwrite
+            the stored cube.
+        return_dataframe (bool): Default True. Set whether to format the data into a dataframe. Can only be False when cube_store_dir is given,
+            in which case only the memory-mapped cube is returned. This can be sliced with stat_xplore_cube_store.get_cube_slice without reading all the data.
 
     Returns:
-        dict: Dictionary with the following items: 'data' - a pandas Data Frame of the request data, or None if request was unsucessfull; 
+        dict: Dictionary with the following items: 'data' - a pandas Data Frame of the request data, or None if request was unsucessfull
+                or return_dataframe is False; 
                 'annotations' - A string of the annotations accoumpanying the data. Contains info on what the data show.
+                'cube' - The memory-mapped cube, as returned by stat_xplore_cube_store.load_cube, if cube_store_dir is given. Otherwise None.
 
     '''
 
+    if (return_dataframe == False) & (cube_store_dir is None):
+        raise ValueError('return_dataframe can only be False when cube_store_dir is given, otherwise no data would be returned.')
+
+    # Check the cube store for data previously returned for this request.
+    # Cubes are keyed by the request arguments so that the store can be checked before building the request body,
+    # which requires requests to the API
+    if cube_store_dir is not None:
+        request_args = {'measure_id':measure_id,
+                        'field_ids':[field_ids] if isinstance(field_ids, str) else field_ids,
+                        'fields_include_total':[fields_include_total] if isinstance(fields_include_total, str) else fields_include_total,
+                        'geog_folder_label':geog_folder_label,
+                        'geog_field_label':geog_field_label,
+                        'geog_level_label':geog_level_label}
+        cube_key = stat_xplore_cube_store.get_cube_key(request_args)
+        cube = None
+        if refresh_cube_store == False:
+            cube = stat_xplore_cube_store.load_cube(cube_key, store_dir = cube_store_dir)
+        if cube is not None:
+            df_data = None
+            if return_dataframe == True:
+                df_data = cube_array_to_dataframe(cube['field_items'], cube['field_headers'], cube['values'])
+            return {'data': df_data, 'annotations':cube['annotations'], 'cube':cube}
+
     # Build request body
     body = build_request_body(table_headers, schema_headers, measure_id, field_ids = field_ids, fields_include_total = fields_include_total, df_schema = df_schema, geog_folder_label = geog_folder_label, geog_field_label = geog_field_label, geog_level_label = geog_level_label)
 
@@ -172,8 +235,10 @@ def get_stat_xplore_measure_data(table_headers, schema_headers, measure_id, fiel
     if response_dict['success'] == True:
         json_data = response_dict['response'].json()
 
-        # Format data into dataframe
-        df_data = json_response_to_dataframe(json_data)
+        # Unpack the fields and data values
+        field_items, field_headers = unpack_response_fields(json_data)
+        measure_uri = json_data['measures'][0]['uri'] 
+        cubes_array = np.array(json_data['cubes'][ measure_uri]['values'])
 
         # Get database annotations (footnaotes)
         database_annotation_keys = json_data['database']['annotationKeys']
@@ -181,9 +246,20 @@ def get_stat_xplore_measure_data(table_headers, schema_headers, measure_id, fiel
         for key in database_annotation_keys:
             database_annotations[key] = json_data['annotationMap'][key]
 
-        return {'data': df_data, 'annotations':database_annotations}
+        # Save the data values to the cube store
+        cube = None
+        if cube_store_dir is not None:
+            stat_xplore_cube_store.save_cube(cube_key, field_items, field_headers, cubes_array, annotations = database_annotations, body = body, store_dir = cube_store_dir)
+            cube = stat_xplore_cube_store.load_cube(cube_key, store_dir = cube_store_dir)
+
+        # Format data into dataframe
+        df_data = None
+        if return_dataframe == True:
+            df_data = cube_array_to_dataframe(field_items, field_headers, cubes_array)
+
+        return {'data': df_data, 'annotations':database_annotations, 'cube':cube}
     else:
-        return {'data':None, 'annotations':None}
+        return {'data':None, 'annotations':None, 'cube':None}
 
 
 def build_request_body(table_headers, schema_headers, measure_id, field_ids = None, fields_include_total = None, df_schema = None, geog_folder_label = 'Geography (residence-based)', geog_field_label= 'National - Regional - LA - OAs', geog_level_label = 'Local Authority'):